@@ -1,12 +1,20 @@
-from typing import List, Dict, Optional
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Iterable, Iterator, Set, Tuple, TextIO
+from urllib.parse import urljoin, urlsplit
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 import os
 from pathlib import Path
 from dataclasses import dataclass
+import hashlib
+
+# The HTTP and HTML libraries are imported where they are used, so importing
+# this module (e.g. just for ForumPost) stays cheap
+if TYPE_CHECKING:
+    import requests
+    from selectolax.lexbor import LexborHTMLParser
 
 # Configure logging
 logging.basicConfig(
@@ -24,13 +32,86 @@ OUTPUT_DIR = Path(__file__).parent.parent / "outputdata"
 # Create output directory if it doesn't exist
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-@dataclass
+# Separators between discussions and posts in the output file
+SEP_EQ = '=' * 80 + '\n'
+SEP_DASH = '-' * 40 + '\n'
+
+# HTTP cache shared between runs. Bump CACHE_VERSION whenever the parsing changes
+# in a way that makes previously cached pages unusable.
+CACHE_VERSION = 1
+CACHE_PATH = OUTPUT_DIR / f"moodle_cache_v{CACHE_VERSION}"
+CACHE_EXPIRE_SECONDS = 3600
+
+# Moodle renders both the discussion list and the discussion posts inside #region-main.
+# Everything before it (head, navbar, drawers) and the page footer is never queried,
+# so only the markup between these two markers is handed to the parser.
+MAIN_REGION_START = b'id="region-main"'
+MAIN_REGION_END = b'id="page-footer"'
+
+# CSS selectors used to locate discussions and post fields. selectolax keeps one Lexbor CSS
+# parser per document, so sharing these constants is all the "compilation" it supports.
+DISCUSSION_LINK_SELECTOR = ".topic .d-flex a.w-100.h-100.d-block"
+PAGINATION_ITEM_SELECTOR = ".pagination li.page-item[data-page-number]"
+POST_SELECTOR = "article.forum-post-container"
+POST_CONTENT_SELECTOR = ".post-content-container"
+POST_HEADER_SELECTOR = "header"
+POST_TITLE_SELECTOR = 'h3[data-region-content="forum-post-core-subject"]'
+POST_AUTHOR_SELECTOR = 'a[href*="/user/view.php"]'
+POST_DATE_SELECTOR = "time"
+POST_CORE_SELECTOR = '[data-region-content="forum-post-core"]'
+# Title, author, date and content of a post in a single grouped query. The matches are
+# told apart by tag (h3, a, time, div), so each selector must match a different tag;
+# the content container is the only div among them.
+POST_FIELDS_SELECTOR = ", ".join([
+    f"{POST_HEADER_SELECTOR} {POST_TITLE_SELECTOR}",
+    f"{POST_HEADER_SELECTOR} {POST_AUTHOR_SELECTOR}",
+    f"{POST_HEADER_SELECTOR} {POST_DATE_SELECTOR}",
+    POST_CONTENT_SELECTOR
+])
+
+# Maximum number of discussion pages fetched at the same time
+MAX_CONCURRENT_REQUESTS = 8
+# Politeness budget shared by all workers: sustained requests per second and burst size
+REQUESTS_PER_SECOND = 2
+REQUEST_BURST = 4
+
+@dataclass(slots=True, frozen=True)
 class ForumPost:
     title: str
     content: str
     author: str
     date: str
 
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        Initialize a thread-safe token bucket limiting how often requests are sent
+        
+        Args:
+            rate: Number of tokens added per second
+            burst: Maximum number of tokens that can be stored
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        """
+        Take a token, blocking until one is available
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            # Reserve the token even if it is not there yet and wait for it outside the lock,
+            # so the other workers can queue up their own reservations meanwhile
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
 class MoodleForumScraper:
     def __init__(self, base_url: str, moodle_session: str, author_to_track: str = ""):
         """
@@ -41,13 +122,61 @@ class MoodleForumScraper:
             moodle_session: The MoodleSession cookie value
             author_to_track: The name of the author to track (will be shown as 'User', others as 'Developer')
         """
+        from requests_cache import DEFAULT_IGNORED_PARAMS, CachedSession
+        from urllib3.util import make_headers
+        from http_session import CookieFreeSQLiteCache, RateLimitedAdapter, RateLimitedRetry
+
         self.base_url = base_url
-        self.session = requests.Session()
+        # Forum URLs live at <wwwroot>/mod/forum/view.php, so the login page sits two
+        # levels up. Only the path is kept, so an http:// forum URL still recognises a
+        # redirect to the https:// login page.
+        self.login_path_prefix = urlsplit(urljoin(base_url, '../../login/')).path
+        # Cached pages are only served back to the session that fetched them, so an
+        # invalid cookie or another account never sees them. Only a hash of the
+        # cookie goes into the cache keys.
+        self.session_key = hashlib.sha256(moodle_session.encode('utf-8')).hexdigest()[:16]
+        # Honor the server's cache headers and revalidate with ETag/Last-Modified,
+        # so unchanged pages come back as 304 on re-runs. Moodle usually answers with
+        # "Cache-Control: private, max-age=0" and no validators, and such pages are not
+        # cached at all. The cookies carry the MoodleSession secret, so they are
+        # redacted from the stored requests and responses.
+        self.session = CachedSession(
+            backend=CookieFreeSQLiteCache(str(CACHE_PATH)),
+            expire_after=CACHE_EXPIRE_SECONDS,
+            cache_control=True,
+            ignored_parameters=[*DEFAULT_IGNORED_PARAMS, 'Cookie', 'Set-Cookie'],
+            key_fn=self.cache_key,
+            filter_fn=self.is_cacheable
+        )
+        # Entries of earlier sessions can never match again, so drop them once they expire
+        self.session.cache.delete(expired=True)
+        # Only requests that reach the server take a token, retries included;
+        # pages served from the cache are not throttled
+        self.rate_limiter = TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST)
+        # Size the connection pool so every worker thread keeps its own keep-alive socket,
+        # and retry transient server errors instead of losing the discussion
+        adapter = RateLimitedAdapter(
+            self.rate_limiter,
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=RateLimitedRetry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                rate_limiter=self.rate_limiter
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.cookies.set('MoodleSession', moodle_session)
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            # Ask for every compression urllib3 can decode here (br/zstd only when installed)
+            'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding']
         })
         self.author_to_track = author_to_track
+        # Discussions of the last iter_discussions() run skipped as already scraped
+        self.duplicate_count = 0
         logging.info(f"Initialized scraper for URL: {base_url}")
         logging.info("Cookie and headers set")
 
@@ -65,7 +194,67 @@ class MoodleForumScraper:
             return "User"
         return "Developer"
 
-    def get_page_content(self, url: str) -> Optional[BeautifulSoup]:
+    def is_login_url(self, url: str) -> bool:
+        """
+        Check whether a URL points to the Moodle login page
+        
+        Args:
+            url: The URL to check, typically the final URL of a response
+            
+        Returns:
+            True if the URL is under the site's login directory
+        """
+        return urlsplit(url).path.startswith(self.login_path_prefix)
+
+    def cache_key(self, request: requests.PreparedRequest, **kwargs) -> str:
+        """
+        Build the HTTP cache key of a request, scoped to this scraper's session
+        
+        Args:
+            request: The request being looked up or saved
+            **kwargs: Matching settings passed on by requests-cache
+            
+        Returns:
+            The default requests-cache key prefixed with a hash of the MoodleSession cookie
+        """
+        from requests_cache import create_key
+
+        return f"{self.session_key}-{create_key(request, **kwargs)}"
+
+    def is_cacheable(self, response: requests.Response) -> bool:
+        """
+        Decide whether a response may be stored in the HTTP cache
+        
+        Args:
+            response: The response about to be cached or served from the cache
+            
+        Returns:
+            True for successful pages; login redirects depend on the session cookie
+            and must never be replayed to a later run
+        """
+        return response.status_code == 200 and not self.is_login_url(response.url)
+
+    def get_main_region(self, html: bytes) -> bytes:
+        """
+        Cut a Moodle page down to its main content region
+        
+        Args:
+            html: The raw page body
+            
+        Returns:
+            The markup from the #region-main element up to the page footer,
+            or the whole page if the region marker is not present
+        """
+        start = html.find(MAIN_REGION_START)
+        if start == -1:
+            return html
+        start = html.rfind(b'<', 0, start)
+        end = html.find(MAIN_REGION_END, start)
+        if end == -1:
+            return html[start:]
+        return html[start:html.rfind(b'<', start, end)]
+
+    def get_page_content(self, url: str) -> Optional[LexborHTMLParser]:
         """
         Fetch and parse a page's content
         
@@ -73,27 +262,33 @@ class MoodleForumScraper:
             url: The URL to fetch
             
         Returns:
-            BeautifulSoup object or None if the request fails
+            Parsed HTML tree or None if the request fails
         """
+        import requests
+        from selectolax.lexbor import LexborHTMLParser
+
         try:
             logging.info(f"Fetching URL: {url}")
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            # Check if we got a login page instead of content
-            if "login" in response.url.lower():
-                logging.error("Got redirected to login page. Session cookie might be invalid")
-                return None
+            # Stream the response so the status and the final URL are checked before the
+            # body is read. Responses the cache refuses (errors and the login page) are
+            # closed unread; cacheable pages are read in full by the cache when saved.
+            with self.session.get(url, stream=True) as response:
+                response.raise_for_status()
                 
-            soup = BeautifulSoup(response.text, 'html.parser')
+                # Check if we got a login page instead of content
+                if self.is_login_url(response.url):
+                    logging.error("Got redirected to login page. Session cookie might be invalid")
+                    return None
+                    
+                tree = LexborHTMLParser(self.get_main_region(response.content))
             
             # Check if we can find any forum content using the new selector
-            #if not soup.select(".forumpost .posting.fullpost") and not soup.select("tr.discussion a.d-block"):
+            #if not tree.css(".forumpost .posting.fullpost") and not tree.css("tr.discussion a.d-block"):
             #    logging.error(f"No forum content found at {url}. Page content type: {response.headers.get('content-type')}")
             #    logging.debug(f"Page content preview: {response.text[:200]}")
             #    return None
                 
-            return soup
+            return tree
             
         except requests.RequestException as e:
             logging.error(f"Error fetching {url}: {str(e)}")
@@ -102,25 +297,62 @@ class MoodleForumScraper:
             logging.error(f"Unexpected error processing {url}: {str(e)}")
             return None
 
-    def get_discussion_links(self, soup: BeautifulSoup) -> List[str]:
+    def get_discussion_links(self, tree: LexborHTMLParser) -> List[str]:
         """
         Extract discussion links from a forum page
         
         Args:
-            soup: BeautifulSoup object of the forum page
+            tree: Parsed HTML tree of the forum page
             
         Returns:
             List of discussion URLs
         """
         discussion_links = []
+        # Bind the method once instead of resolving it on every iteration
+        links_append = discussion_links.append
         # Look for discussion links using the new selector
-        for link in soup.select(".topic .d-flex a.w-100.h-100.d-block"):
-            discussion_url = urljoin(self.base_url, link.get('href'))
+        for link in tree.css(DISCUSSION_LINK_SELECTOR):
+            discussion_url = urljoin(self.base_url, link.attributes.get('href'))
             if discussion_url:
-                logging.info(f"Found discussion: {link.text.strip()} - {discussion_url}")
-                discussion_links.append(discussion_url)
+                logging.info(f"Found discussion: {link.text(strip=True)} - {discussion_url}")
+                links_append(discussion_url)
         return discussion_links
 
+    def get_total_pages(self, tree: LexborHTMLParser) -> int:
+        """
+        Read the number of listing pages from the forum's paging bar
+        
+        Args:
+            tree: Parsed HTML tree of the forum page
+            
+        Returns:
+            The highest page number in the paging bar, or 1 if the forum has a single page
+        """
+        # Moodle tags every paging bar item with its 1-based page number; the aria-label
+        # is localized, so the data attribute is the reliable signal
+        page_numbers = [
+            int(page_number)
+            for item in tree.css(PAGINATION_ITEM_SELECTOR)
+            if (page_number := item.attributes.get('data-page-number')) and page_number.isdigit()
+        ]
+        return max(page_numbers, default=1)
+
+    def scrape_listing_page(self, page: int) -> List[str]:
+        """
+        Fetch a forum listing page and extract its discussion links
+        
+        Args:
+            page: The 0-based page number
+            
+        Returns:
+            List of discussion URLs, empty if the page could not be fetched
+        """
+        logging.info(f"Scraping page {page}")
+        tree = self.get_page_content(f"{self.base_url}&page={page}")
+        if not tree:
+            return []
+        return self.get_discussion_links(tree)
+
     def extract_posts_from_discussion(self, url: str) -> List[ForumPost]:
         """
         Extract all posts from a discussion page
@@ -131,108 +363,173 @@ class MoodleForumScraper:
         Returns:
             List of ForumPost objects
         """
-        soup = self.get_page_content(url)
-        if not soup:
+        tree = self.get_page_content(url)
+        if not tree:
             return []
 
         posts = []
+        # Bind the method once instead of resolving it on every iteration
+        posts_append = posts.append
         # Get all forum posts
-        for post_article in soup.select("article.forum-post-container"):
+        for post_article in tree.css(POST_SELECTOR):
             try:
-                # Get the post content div
-                post_content = post_article.select_one(".post-content-container")
-                # Get header info
-                header = post_article.select_one("header")
+                # Collect every field in one walk of the post's own core (replies are nested
+                # inside the article, so the core keeps them out), keeping the first node per tag
+                post_core = post_article.css_first(POST_CORE_SELECTOR) or post_article
+                fields = {}
+                for node in post_core.css(POST_FIELDS_SELECTOR):
+                    fields.setdefault(node.tag, node)
+                title = fields.get('h3')
+                author_link = fields.get('a')
+                date = fields.get('time')
+                post_content = fields.get('div')
                 
-                if post_content and header:
-                    # Extract title
-                    title = header.select_one('h3[data-region-content="forum-post-core-subject"]')
-                    # Extract author
-                    author_link = header.select_one('a[href*="/user/view.php"]')
-                    # Extract date
-                    date = header.select_one('time')
+                if all([title, author_link, date, post_content]):
+                    # The author link only holds the user's name, so skip the recursive walk
+                    original_author = author_link.text(deep=False, strip=True)
+                    processed_author = self.process_author(original_author)
                     
-                    if all([title, author_link, date, post_content]):
-                        original_author = author_link.get_text(strip=True)
-                        processed_author = self.process_author(original_author)
-                        
-                        post = ForumPost(
-                            title=title.get_text(strip=True),
-                            content=post_content.get_text(strip=True),
-                            author=processed_author,
-                            date=date.get('datetime', '')
-                        )
-                        # Log the scraped post to console
-                        logging.info(f"\nPost found:")
-                        logging.info(f"Title: {post.title}")
-                        logging.info(f"Author: {post.author}")
-                        logging.info(f"Date: {post.date}")
-                        logging.info(f"Content: {post.content[:100]}...")  # Show first 100 chars of content
-                        
-                        posts.append(post)
-                    else:
-                        logging.warning(f"Incomplete post data found. Missing some required elements.")
+                    post = ForumPost(
+                        title=title.text(strip=True),
+                        # One traversal of the body; the separator keeps paragraphs apart and the
+                        # line breaks inside text nodes (code snippets) are kept, while the empty
+                        # lines left by whitespace-only nodes are dropped
+                        content='\n'.join(
+                            line for line in post_content.text(separator='\n', strip=True).splitlines()
+                            if line.strip()
+                        ),
+                        author=processed_author,
+                        date=date.attributes.get('datetime', '')
+                    )
+                    # Log the scraped post to console
+                    logging.info(f"\nPost found:")
+                    logging.info(f"Title: {post.title}")
+                    logging.info(f"Author: {post.author}")
+                    logging.info(f"Date: {post.date}")
+                    logging.info(f"Content: {post.content[:100]}...")  # Show first 100 chars of content
+                    
+                    posts_append(post)
+                else:
+                    logging.warning(f"Incomplete post data found. Missing some required elements.")
             except Exception as e:
                 logging.error(f"Error extracting post data: {str(e)}")
                 continue
 
         return posts
 
-    def scrape_forum(self) -> Dict[str, List[ForumPost]]:
+    def scrape_discussion(self, discussion_url: str) -> List[ForumPost]:
         """
-        Scrape all discussions and posts from the forum
+        Scrape a single discussion
         
+        Args:
+            discussion_url: The URL of the discussion
+            
         Returns:
-            Dictionary mapping discussion URLs to lists of posts
+            List of ForumPost objects
+        """
+        logging.info(f"Scraping discussion: {discussion_url}")
+        return self.extract_posts_from_discussion(discussion_url)
+
+    def iter_discussions(self, seen_urls: Optional[Set[str]] = None) -> Iterator[Tuple[str, List[ForumPost]]]:
         """
-        all_discussions = {}
-        page = 0
+        Scrape the forum, yielding the discussions in forum order as their posts are extracted.
+        Discussions are fetched by up to MAX_CONCURRENT_REQUESTS threads; only the ones that
+        finish ahead of the next discussion to yield are kept in memory
         
-        while True:
-            url = f"{self.base_url}&page={page}"
-            logging.info(f"Scraping page {page}")
+        Args:
+            seen_urls: Discussion URLs already scraped (e.g. from another forum), which are
+                skipped and counted in duplicate_count. The URLs scraped here are added to it
             
-            soup = self.get_page_content(url)
-            if not soup:
-                break
+        Returns:
+            Iterator of (discussion URL, list of posts) pairs for non-empty discussions
+        """
+        logging.info("Scraping page 0")
+        first_page = self.get_page_content(f"{self.base_url}&page=0")
+        if not first_page:
+            return
 
-            discussion_links = self.get_discussion_links(soup)
-            if not discussion_links:
-                break
+        # The first page tells how many listing pages there are, so the remaining
+        # ones are fetched as a bounded range instead of probing until an empty page
+        total_pages = self.get_total_pages(first_page)
+        discussion_urls = self.get_discussion_links(first_page)
 
-            for discussion_url in discussion_links:
-                logging.info(f"Scraping discussion: {discussion_url}")
-                posts = self.extract_posts_from_discussion(discussion_url)
+        executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+        try:
+            for page_links in executor.map(self.scrape_listing_page, range(1, total_pages)):
+                discussion_urls.extend(page_links)
+
+            # A discussion can show up on more than one listing page or forum; scrape it once
+            if seen_urls is None:
+                seen_urls = set()
+            unique_urls = list(dict.fromkeys(discussion_urls))
+            discussion_urls = [url for url in unique_urls if url not in seen_urls]
+            seen_urls.update(discussion_urls)
+            self.duplicate_count = len(unique_urls) - len(discussion_urls)
+            if self.duplicate_count:
+                logging.info(f"Skipping {self.duplicate_count} discussions already scraped from another forum")
+
+            # map() yields in submission order, so the output follows the forum order
+            for discussion_url, posts in zip(discussion_urls, executor.map(self.scrape_discussion, discussion_urls)):
                 if posts:
-                    all_discussions[discussion_url] = posts
-                time.sleep(1)  # Be nice to the server
+                    yield discussion_url, posts
+        finally:
+            # If the consumer stops early (Ctrl+C, a write error, closing the generator),
+            # drop the queued fetches instead of waiting for the rest of the forum
+            executor.shutdown(wait=False, cancel_futures=True)
 
-            page += 1
+    def scrape_forum(self, output: TextIO, seen_urls: Optional[Set[str]] = None) -> Tuple[int, int]:
+        """
+        Scrape all discussions and posts from the forum, writing each discussion
+        to the output as soon as it is scraped
+        
+        Args:
+            output: Open text file the discussions are written to
+            seen_urls: Discussion URLs already written, which are skipped
+            
+        Returns:
+            Tuple with the number of discussions and posts written
+        """
+        return self.save_to_file(self.iter_discussions(seen_urls), output)
 
-        return all_discussions
+    def write_discussion(self, output: TextIO, url: str, posts: List[ForumPost]):
+        """
+        Write a single discussion and its posts to an open text file
+        
+        Args:
+            output: Open text file to write to
+            url: The URL of the discussion
+            posts: The posts of the discussion
+        """
+        # Build the whole discussion first so it is written in a single call
+        chunks = [f"\n{SEP_EQ}Discussion URL: {url}\n{SEP_EQ}\n"]
+        for post in posts:
+            chunks.append(
+                f"Title: {post.title}\n"
+                f"Author: {post.author}\n"
+                f"Date: {post.date}\n"
+                f"Content:\n{post.content}\n"
+                f"\n{SEP_DASH}\n"
+            )
+        output.write(''.join(chunks))
 
-    def save_to_file(self, discussions: Dict[str, List[ForumPost]], output_file: str):
+    def save_to_file(self, discussions: Iterable[Tuple[str, List[ForumPost]]], output: TextIO) -> Tuple[int, int]:
         """
-        Save the scraped discussions to a text file
+        Save the scraped discussions to an open text file, one discussion at a time
         
         Args:
-            discussions: Dictionary of discussion URLs and their posts
-            output_file: Path to the output file
-        """
-        output_path = OUTPUT_DIR / output_file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for url, posts in discussions.items():
-                f.write(f"\n{'='*80}\n")
-                f.write(f"Discussion URL: {url}\n")
-                f.write(f"{'='*80}\n\n")
-                
-                for post in posts:
-                    f.write(f"Title: {post.title}\n")
-                    f.write(f"Author: {post.author}\n")
-                    f.write(f"Date: {post.date}\n")
-                    f.write(f"Content:\n{post.content}\n")
-                    f.write(f"\n{'-'*40}\n\n")
-        logging.info(f"Forum content has been saved to {output_path}")
+            discussions: Iterable of discussion URLs and their posts, e.g. iter_discussions()
+            output: Open text file the discussions are written to
+            
+        Returns:
+            Tuple with the number of discussions and posts written
+        """
+        discussion_count = 0
+        post_count = 0
+        for url, posts in discussions:
+            self.write_discussion(output, url, posts)
+            discussion_count += 1
+            post_count += len(posts)
+        return discussion_count, post_count
 
 def main():
     """
@@ -242,7 +539,7 @@ def main():
     1. Prompts for a MoodleSession cookie value
     2. Allows the user to input multiple Moodle forum URLs
     3. Scrapes all discussions and posts from each forum
-    4. Combines all content into a single output file
+    4. Streams all content into a single output file as it is scraped
     5. Shows statistics about total discussions and posts scraped
     
     The output file location is determined by:
@@ -258,42 +555,60 @@ def main():
             logging.error("MoodleSession cookie is required")
             return
 
-        output_file = os.getenv('OUT_FILE', DEFAULT_OUTPUT_FILE)
-        all_discussions = {}
+        output_path = OUTPUT_DIR / os.getenv('OUT_FILE', DEFAULT_OUTPUT_FILE)
+        # Stream into a temporary file so a run that scrapes nothing (or is cancelled)
+        # leaves the previous export untouched
+        temp_path = output_path.with_name(output_path.name + '.tmp')
+        seen_urls = set()
+        total_discussions = 0
+        total_posts = 0
         
-        while True:
-            forum_url = input("Enter the Moodle forum URL (or press Enter to finish): ")
-            if not forum_url:
-                break
+        # Every forum streams its discussions into the same file as they are scraped
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                while True:
+                    forum_url = input("Enter the Moodle forum URL (or press Enter to finish): ")
+                    if not forum_url:
+                        break
+                    
+                    if not forum_url.startswith(('http://', 'https://')):
+                        logging.error("Invalid URL. Please enter a complete URL starting with http:// or https://")
+                        continue
                 
-            if not forum_url.startswith(('http://', 'https://')):
-                logging.error("Invalid URL. Please enter a complete URL starting with http:// or https://")
-                continue
-            
-            logging.info(f"Starting forum scraping for URL: {forum_url}")
-            scraper = MoodleForumScraper(forum_url, moodle_session, author_to_track)
-            discussions = scraper.scrape_forum()
-
-            if not discussions:
-                logging.error(f"No discussions were found for {forum_url}. This could mean:")
-                logging.error("1. The MoodleSession cookie is invalid or expired")
-                logging.error("2. The URL is not a valid Moodle forum")
-                logging.error("3. The forum is empty")
-                logging.error("4. The forum requires additional permissions")
-                continue
+                    logging.info(f"Starting forum scraping for URL: {forum_url}")
+                    scraper = MoodleForumScraper(forum_url, moodle_session, author_to_track)
+                    discussion_count, post_count = scraper.scrape_forum(f, seen_urls)
 
-            all_discussions.update(discussions)
-            
-        if not all_discussions:
+                    if not discussion_count and scraper.duplicate_count:
+                        logging.warning(
+                            f"No new discussions for {forum_url}: all {scraper.duplicate_count} "
+                            "were already scraped from an earlier forum"
+                        )
+                        continue
+
+                    if not discussion_count:
+                        logging.error(f"No discussions were found for {forum_url}. This could mean:")
+                        logging.error("1. The MoodleSession cookie is invalid or expired")
+                        logging.error("2. The URL is not a valid Moodle forum")
+                        logging.error("3. The forum is empty")
+                        logging.error("4. The forum requires additional permissions")
+                        continue
+
+                    total_discussions += discussion_count
+                    total_posts += post_count
+
+            if total_discussions:
+                os.replace(temp_path, output_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        if not total_discussions:
             logging.error("No discussions were scraped from any forum")
             return
 
-        # Save all discussions to a single file
-        scraper = MoodleForumScraper("", moodle_session, author_to_track)  # Create a scraper instance just for saving
-        scraper.save_to_file(all_discussions, output_file)
-        
-        logging.info(f"Total discussions scraped: {len(all_discussions)}")
-        total_posts = sum(len(posts) for posts in all_discussions.values())
+        logging.info(f"Forum content has been saved to {output_path}")
+        logging.info(f"Total discussions scraped: {total_discussions}")
         logging.info(f"Total posts scraped: {total_posts}")
 
     except KeyboardInterrupt:
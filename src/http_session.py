@@ -0,0 +1,87 @@
+from typing import Optional
+from datetime import datetime
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from requests_cache import CachedResponse, SQLiteCache
+from urllib3.util import Retry
+
+
+class CookieFreeSQLiteCache(SQLiteCache):
+    def save_response(
+        self,
+        response: Response,
+        cache_key: Optional[str] = None,
+        expires: Optional[datetime] = None,
+    ):
+        """
+        Save a response to the cache without the cookie jars of the request and response.
+        requests-cache redacts ignored headers such as Cookie, but it still stores the
+        jars, which hold the MoodleSession secret in plaintext. The redirects that led
+        to the response are stored with it and their headers are not redacted, so they
+        are stripped of the Cookie header and jars as well
+
+        Args:
+            response: Response to save
+            cache_key: Cache key for this response
+            expires: Absolute expiration time for this response
+        """
+        if isinstance(response, CachedResponse):
+            # Revalidated responses were stripped when they were first saved
+            super().save_response(response, cache_key, expires)
+            return
+
+        originals = [(hop, hop.request, hop.cookies) for hop in [response, *response.history]]
+        # Swap the stripped copies in only while saving; the caller keeps the originals
+        for hop, request, _ in originals:
+            stripped_request = request.copy()
+            stripped_request.headers.pop('Cookie', None)
+            stripped_request.prepare_cookies(RequestsCookieJar())
+            hop.request, hop.cookies = stripped_request, RequestsCookieJar()
+        try:
+            super().save_response(response, cache_key, expires)
+        finally:
+            for hop, request, cookies in originals:
+                hop.request, hop.cookies = request, cookies
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, rate_limiter, *args, **kwargs):
+        """
+        Initialize an adapter that takes a token from the rate limiter for every request
+        it sends. Responses served from the cache never reach the adapter, so they are
+        not limited
+
+        Args:
+            rate_limiter: Object whose acquire() blocks until a request may be sent
+        """
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.acquire()
+        return super().send(request, **kwargs)
+
+
+class RateLimitedRetry(Retry):
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        """
+        Initialize a retry policy whose retried attempts also take a token from the rate
+        limiter, since urllib3 resends them without going back through the adapter
+
+        Args:
+            rate_limiter: Object whose acquire() blocks until a request may be sent
+        """
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kw):
+        # urllib3 builds a new Retry for every attempt, so carry the limiter over
+        retry = super().new(**kw)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
@@ -1,50 +1,368 @@
-from forum_scraper import MoodleForumScraper
-from bs4 import BeautifulSoup
 import logging
+import pytest
+
+@pytest.fixture(autouse=True)
+def temporary_cache(tmp_path, monkeypatch):
+    # Keep the HTTP cache of the scrapers built in the tests out of outputdata/
+    import forum_scraper
+    monkeypatch.setattr(forum_scraper, "CACHE_PATH", tmp_path / "moodle_cache")
 
 def test_discussion_links():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
     print("\nTesting discussion link extraction...")
     # Read the demo HTML file
-    with open("demo.htlm", "r", encoding='utf-8') as f:
+    with open("demo.htlm", "rb") as f:
         html_content = f.read()
 
-    # Create a BeautifulSoup object
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # Parse the HTML content
+    tree = LexborHTMLParser(html_content)
 
     # Create a scraper instance with dummy values
     scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session")
 
     # Test discussion link extraction
-    links = scraper.get_discussion_links(soup)
+    links = scraper.get_discussion_links(tree)
     print("\nFound Discussion Links:")
     for link in links:
         print(f"- {link}")
 
 def test_post_extraction():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
     print("\nTesting post content extraction...")
     # Read the actual discussion page HTML file
-    with open("src/demodisusionpage.html", "r", encoding='utf-8') as f:
+    with open("src/demodisusionpage.html", "rb") as f:
         html_content = f.read()
 
-    # Create a BeautifulSoup object
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # Parse the HTML content
+    tree = LexborHTMLParser(html_content)
 
-    # Create a scraper instance with dummy values
-    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session")
+    # Create a scraper instance tracking the author of the reply
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session", "Tomas Bañales Gutierrez")
 
     # Override the get_page_content method for testing
-    scraper.get_page_content = lambda url: soup
+    scraper.get_page_content = lambda url: tree
 
     # Test post extraction
     posts = scraper.extract_posts_from_discussion("https://example.com/discussion")
-    print("\nExtracted Posts:")
-    for i, post in enumerate(posts, 1):
-        print(f"\nPost {i}:")
-        print(f"Title: {post.title}")
-        print(f"Author: {post.author}")
-        print(f"Date: {post.date}")
-        print(f"Content: {post.content}")
+
+    assert [post.title for post in posts] == ["Encriptación de contraseña", "Re: Encriptación de contraseña"]
+    assert [post.author for post in posts] == ["Developer", "User"]
+    assert [post.date for post in posts] == ["2025-05-01T20:55:10-03:00", "2025-05-02T12:28:43-03:00"]
+    assert [post.content for post in posts] == [
+        "Buenas sirve base64 para la encriptación o se requiere un método mas sofisticado?\nGracias.",
+        "Que tal? Si, base64 esta perfecto.\nSaludos."
+    ]
+
+def test_ShouldKeepLineBreaksGivenCodeSnippetInPost():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
+    html = b"""
+    <article class="forum-post-container">
+      <header>
+        <h3 data-region-content="forum-post-core-subject">Duda</h3>
+        <a href="https://aulas.ort.edu.uy/user/view.php?id=1">Ana</a>
+        <time datetime="2025-05-01T10:00:00-03:00">1 de mayo</time>
+      </header>
+      <div class="post-content-container">
+        <p>Mi codigo:</p>
+        <pre>def f(x):
+    return x + 1</pre>
+        <p>Linea uno<br>linea dos</p>
+      </div>
+    </article>
+    """
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session")
+    scraper.get_page_content = lambda url: LexborHTMLParser(html)
+
+    posts = scraper.extract_posts_from_discussion("https://example.com/discussion")
+
+    assert [post.content for post in posts] == [
+        "Mi codigo:\ndef f(x):\n    return x + 1\nLinea uno\nlinea dos"
+    ]
+
+def test_ShouldReturnLastPageNumberGivenPagingBar():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
+    # Paging bar as rendered by Moodle while viewing the first of 4 pages
+    tree = LexborHTMLParser(
+        '<nav aria-label="Página" class="pagination pagination-centered justify-content-center">'
+        '<ul class="mt-1 pagination " data-page-size="100">'
+        '<li class="page-item active" data-page-number="1"><a href="#" class="page-link">1</a></li>'
+        '<li class="page-item" data-page-number="2"><a href="#" class="page-link">2</a></li>'
+        '<li class="page-item" data-page-number="4"><a href="#" class="page-link">Última</a></li>'
+        '<li class="page-item" data-page-number="2"><a href="#" class="page-link">Siguiente</a></li>'
+        '</ul></nav>'
+    )
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session")
+
+    assert scraper.get_total_pages(tree) == 4
+    assert scraper.get_total_pages(LexborHTMLParser("<p>No paging bar</p>")) == 1
+
+def test_ShouldReturnRegionMainGivenMoodlePage():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session")
+    main_region = (
+        b'<section id="region-main" aria-label="Contenido">'
+        b'<div class="topic"><div class="d-flex">'
+        b'<a class="w-100 h-100 d-block" href="/mod/forum/discuss.php?d=1">Tema</a>'
+        b'</div></div>'
+        b'<nav class="pagination"><ul class="pagination">'
+        b'<li class="page-item" data-page-number="3"><a class="page-link" href="#">3</a></li>'
+        b'</ul></nav>'
+        b'</section></div>'
+    )
+    page = (
+        b'<html><head><script>var M = {};</script></head><body>'
+        b'<nav class="navbar"><a class="w-100 h-100 d-block" href="/nav">Nav</a></nav>'
+        b'<div id="region-main-box">' + main_region +
+        b'<footer id="page-footer" class="footer">Footer</footer></body></html>'
+    )
+
+    # Marker and footer present: only the main region is kept
+    assert scraper.get_main_region(page) == main_region
+
+    # Marker present without footer: everything from the main region onwards is kept
+    page_without_footer = page[:page.index(b'<footer')]
+    assert scraper.get_main_region(page_without_footer) == main_region
+
+    # region-main-box alone must not be taken for the main region
+    box_only = b'<div id="region-main-box"><p>Content</p></div>'
+    assert scraper.get_main_region(box_only) == box_only
+
+    # The discussion rows and the paging bar are still found after slicing
+    tree = LexborHTMLParser(scraper.get_main_region(page))
+    assert scraper.get_discussion_links(tree) == ["https://aulas.ort.edu.uy/mod/forum/discuss.php?d=1"]
+    assert scraper.get_total_pages(tree) == 3
+
+def test_ShouldCancelQueuedDiscussionsGivenGeneratorClosedEarly():
+    import time
+    from forum_scraper import MoodleForumScraper, ForumPost, MAX_CONCURRENT_REQUESTS
+    from selectolax.lexbor import LexborHTMLParser
+
+    listing = LexborHTMLParser(
+        '<div class="topic"><div class="d-flex">'
+        + ''.join(f'<a class="w-100 h-100 d-block" href="/d{i}">Tema {i}</a>' for i in range(40))
+        + '</div></div>'
+    )
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy/mod/forum/view.php?id=1", "dummy_session")
+    scraper.get_page_content = lambda url: listing
+    fetched = []
+
+    def slow_discussion(url):
+        fetched.append(url)
+        time.sleep(0.1)
+        return [ForumPost("Title", "Content", "Developer", "Date")]
+    scraper.scrape_discussion = slow_discussion
+
+    discussions = scraper.iter_discussions()
+    next(discussions)
+    start = time.monotonic()
+    discussions.close()
+
+    # Only the fetches already running finish; the queued ones are cancelled
+    assert time.monotonic() - start < 0.5
+    time.sleep(0.2)
+    assert len(fetched) <= 2 * MAX_CONCURRENT_REQUESTS
+
+def test_ShouldYieldDiscussionsInForumOrderOnceGivenDuplicatedLinks():
+    import time
+    from forum_scraper import MoodleForumScraper, ForumPost
+    from selectolax.lexbor import LexborHTMLParser
+
+    # d1 is listed twice and d0 was already scraped from another forum
+    listing = LexborHTMLParser(
+        '<div class="topic"><div class="d-flex">'
+        + ''.join(f'<a class="w-100 h-100 d-block" href="/d{i}">Tema</a>' for i in [0, 1, 2, 1, 3])
+        + '</div></div>'
+    )
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy/mod/forum/view.php?id=1", "dummy_session")
+    scraper.get_page_content = lambda url: listing
+
+    def discussion(url):
+        # Earlier discussions finish last
+        time.sleep(0.05 * (4 - int(url[-1])))
+        return [ForumPost("Title", "Content", "Developer", "Date")]
+    scraper.scrape_discussion = discussion
+
+    seen_urls = {"https://aulas.ort.edu.uy/d0"}
+    urls = [url for url, posts in scraper.iter_discussions(seen_urls)]
+
+    assert urls == ["https://aulas.ort.edu.uy/d1", "https://aulas.ort.edu.uy/d2", "https://aulas.ort.edu.uy/d3"]
+    assert seen_urls == {f"https://aulas.ort.edu.uy/d{i}" for i in range(4)}
+    assert scraper.duplicate_count == 1
+
+    # Scraping the same listing again only finds discussions already written
+    assert list(scraper.iter_discussions(seen_urls)) == []
+    assert scraper.duplicate_count == 4
+
+def test_ShouldDetectLoginRedirectGivenSchemeChange():
+    from forum_scraper import MoodleForumScraper
+
+    scraper = MoodleForumScraper("http://aulas.ort.edu.uy/moodle/mod/forum/view.php?id=1", "dummy_session")
+
+    assert scraper.is_login_url("https://aulas.ort.edu.uy/moodle/login/index.php")
+    assert not scraper.is_login_url("https://aulas.ort.edu.uy/moodle/mod/forum/discuss.php?d=1")
+
+def test_ShouldNotCacheResponseGivenLoginRedirectOrError():
+    import requests
+    from forum_scraper import MoodleForumScraper
+
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy/mod/forum/view.php?id=1", "dummy_session")
+
+    def response(url, status_code=200):
+        result = requests.Response()
+        result.url = url
+        result.status_code = status_code
+        return result
+
+    assert scraper.is_cacheable(response("https://aulas.ort.edu.uy/mod/forum/discuss.php?d=1"))
+    assert not scraper.is_cacheable(response("https://aulas.ort.edu.uy/login/index.php"))
+    assert not scraper.is_cacheable(response("https://aulas.ort.edu.uy/mod/forum/discuss.php?d=1", 404))
+
+def test_ShouldWaitForRefillGivenBurstExhausted():
+    from unittest import mock
+    from forum_scraper import TokenBucket
+
+    clock = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    with mock.patch("forum_scraper.time.monotonic", lambda: clock[0]), \
+            mock.patch("forum_scraper.time.sleep", sleep):
+        bucket = TokenBucket(rate=2, burst=4)
+        for _ in range(4):
+            bucket.acquire()
+        assert sleeps == []
+
+        # Once the burst is spent each caller waits for its own token to refill
+        bucket.acquire()
+        bucket.acquire()
+        assert sleeps == [0.5, 1.0]
+
+        # Idle time refills the bucket, but never beyond the burst size
+        sleeps.clear()
+        clock[0] += 60
+        for _ in range(4):
+            bucket.acquire()
+        assert sleeps == []
+        bucket.acquire()
+        assert sleeps == [0.5]
+
+def test_ShouldTakeTokenGivenRetriedRequest():
+    from unittest import mock
+    from http_session import RateLimitedRetry
+
+    rate_limiter = mock.Mock()
+    retry = RateLimitedRetry(total=3, backoff_factor=0, rate_limiter=rate_limiter)
+    retry = retry.increment(method="GET", url="/mod/forum/discuss.php?d=1")
+
+    assert retry.rate_limiter is rate_limiter
+    retry.sleep()
+    rate_limiter.acquire.assert_called_once()
+
+def test_ShouldMissCacheGivenDifferentSessionCookie():
+    import io
+    from requests.adapters import HTTPAdapter
+    from urllib3 import HTTPResponse
+    from forum_scraper import MoodleForumScraper
+
+    class PageAdapter(HTTPAdapter):
+        # Answers every request with a cacheable page and counts what reaches the network
+        def __init__(self):
+            super().__init__()
+            self.sent = 0
+
+        def send(self, request, **kwargs):
+            self.sent += 1
+            raw = HTTPResponse(
+                body=io.BytesIO(b"<html></html>"),
+                status=200,
+                headers={"Content-Type": "text/html"},
+                preload_content=False,
+                request_url=request.url
+            )
+            return self.build_response(request, raw)
+
+    def requests_sent(moodle_session):
+        scraper = MoodleForumScraper("https://aulas.ort.edu.uy/mod/forum/view.php?id=1", moodle_session)
+        adapter = PageAdapter()
+        scraper.session.mount("https://", adapter)
+        scraper.session.get("https://aulas.ort.edu.uy/mod/forum/discuss.php?d=1").close()
+        return adapter.sent
+
+    assert requests_sent("first_session") == 1
+    assert requests_sent("first_session") == 0
+    assert requests_sent("second_session") == 1
+
+def test_ShouldKeepRepliesApartGivenNestedPostArticles():
+    from forum_scraper import MoodleForumScraper
+    from selectolax.lexbor import LexborHTMLParser
+
+    def post(title, author, date, content, core=True, replies=""):
+        fields = f"""
+          <header>
+            <h3 data-region-content="forum-post-core-subject">{title}</h3>
+            <a href="https://aulas.ort.edu.uy/user/view.php?id=1">{author}</a>
+            {f'<time datetime="{date}">{date}</time>' if date else ''}
+          </header>
+          <div class="post-content-container"><p>{content}</p></div>
+        """
+        if core:
+            fields = f'<div data-region-content="forum-post-core">{fields}</div>'
+        return f"""
+        <article class="forum-post-container">
+          {fields}
+          <div class="indent" data-region="replies-container">{replies}</div>
+        </article>
+        """
+
+    reply = post("Re: Duda", "Beto", "2025-05-02T10:00:00-03:00", "Respuesta")
+    parent = post("Duda", "Ana", "2025-05-01T10:00:00-03:00", "Pregunta", replies=reply)
+    # An article without its own core region falls back to the whole article
+    no_core = post("Otra duda", "Carla", "2025-05-03T10:00:00-03:00", "Sin core", core=False)
+    html = f"<html><body>{parent}{no_core}</body></html>".encode("utf-8")
+
+    scraper = MoodleForumScraper("https://aulas.ort.edu.uy", "dummy_session", "Beto")
+    scraper.get_page_content = lambda url: LexborHTMLParser(html)
+
+    posts = scraper.extract_posts_from_discussion("https://example.com/discussion")
+
+    assert [post.title for post in posts] == ["Duda", "Re: Duda", "Otra duda"]
+    assert [post.author for post in posts] == ["Developer", "User", "Developer"]
+    assert [post.date for post in posts] == [
+        "2025-05-01T10:00:00-03:00", "2025-05-02T10:00:00-03:00", "2025-05-03T10:00:00-03:00"
+    ]
+    assert [post.content for post in posts] == ["Pregunta", "Respuesta", "Sin core"]
+
+    # A post missing a field is skipped instead of borrowing it from its nested reply
+    parent = post("Sin fecha", "Ana", None, "Pregunta", replies=reply)
+    html = f"<html><body>{parent}</body></html>".encode("utf-8")
+
+    posts = scraper.extract_posts_from_discussion("https://example.com/discussion")
+
+    assert [(post.title, post.date) for post in posts] == [("Re: Duda", "2025-05-02T10:00:00-03:00")]
 
 if __name__ == "__main__":
     test_discussion_links()
     test_post_extraction()
+    test_ShouldKeepLineBreaksGivenCodeSnippetInPost()
+    test_ShouldReturnLastPageNumberGivenPagingBar()
+    test_ShouldReturnRegionMainGivenMoodlePage()
+    test_ShouldCancelQueuedDiscussionsGivenGeneratorClosedEarly()
+    test_ShouldYieldDiscussionsInForumOrderOnceGivenDuplicatedLinks()
+    test_ShouldDetectLoginRedirectGivenSchemeChange()
+    test_ShouldNotCacheResponseGivenLoginRedirectOrError()
+    test_ShouldWaitForRefillGivenBurstExhausted()
+    test_ShouldTakeTokenGivenRetriedRequest()
+    test_ShouldMissCacheGivenDifferentSessionCookie()
+    test_ShouldKeepRepliesApartGivenNestedPostArticles()